@@ -20,39 +20,32 @@ def load_data():
         data = json.load(f)
     return data['properties']
 
-def calculate_deal_score(properties):
-    """
-    Calculate deal scores using Isolation Forest.
-    Properties with unusual price/feature ratios get flagged.
-    """
-    # Filter to valid properties
-    valid = []
-    for p in properties:
-        if not all([p.get('sqft'), p.get('beds'), p.get('price')]):
-            continue
-        if p['sqft'] <= 0 or p['price'] <= 50000 or p['price'] > 5000000:
-            continue
-        if p['sqft'] > 10000:
-            continue
-        
-        # Calculate price per sqft
-        ppsf = p['price'] / p['sqft']
-        
-        valid.append({
-            'property': p,
-            'ppsf': ppsf,
-            'features': [
-                p['sqft'],
-                p.get('beds', 0),
-                p.get('baths', 0) or 0,
-                p.get('yearBuilt', 1970) or 1970,
-                ppsf
-            ]
-        })
-    
-    print(f"Analyzing {len(valid)} properties...")
-    
-    # Extract features
+def property_features(p):
+    """Deal-scoring features for one property, or None if it can't be scored"""
+    if not all([p.get('sqft'), p.get('beds'), p.get('price')]):
+        return None
+    if p['sqft'] <= 0 or p['price'] <= 50000 or p['price'] > 5000000:
+        return None
+    if p['sqft'] > 10000:
+        return None
+    
+    # Calculate price per sqft
+    ppsf = p['price'] / p['sqft']
+    
+    return {
+        'property': p,
+        'ppsf': ppsf,
+        'features': [
+            p['sqft'],
+            p.get('beds', 0),
+            p.get('baths', 0) or 0,
+            p.get('yearBuilt', 1970) or 1970,
+            ppsf
+        ]
+    }
+
+def fit_deal_model(valid):
+    """Fit the scaler and Isolation Forest, keeping the score range for normalizing"""
     X = np.array([v['features'] for v in valid])
     
     # Scale features
@@ -66,21 +59,43 @@ def calculate_deal_score(properties):
         random_state=42,
         n_estimators=100
     )
+    clf.fit(X_scaled)
     
-    # Get anomaly scores (-1 = anomaly, 1 = normal)
-    predictions = clf.fit_predict(X_scaled)
     scores = clf.decision_function(X_scaled)  # Higher = more normal
+    return clf, scaler, (scores.min(), scores.max())
+
+def score_properties(valid, clf, scaler, score_range):
+    """Write dealScore/isAnomaly/pricePerSqft onto each property"""
+    X_scaled = scaler.transform(np.array([v['features'] for v in valid]))
+    
+    # Get anomaly scores (-1 = anomaly, 1 = normal)
+    predictions = clf.predict(X_scaled)
+    scores = clf.decision_function(X_scaled)
     
     # Normalize scores to 0-100 (higher = better deal)
     # Invert because lower decision_function = more anomalous = potential deal
-    min_score, max_score = scores.min(), scores.max()
+    min_score, max_score = score_range
     normalized = 100 - ((scores - min_score) / (max_score - min_score) * 100)
+    normalized = np.clip(normalized, 0, 100)
     
     # Add scores to properties
     for i, v in enumerate(valid):
         v['property']['dealScore'] = int(normalized[i])
         v['property']['isAnomaly'] = int(predictions[i] == -1)
         v['property']['pricePerSqft'] = int(v['ppsf'])
+
+def calculate_deal_score(properties):
+    """
+    Calculate deal scores using Isolation Forest.
+    Properties with unusual price/feature ratios get flagged.
+    """
+    # Filter to valid properties
+    valid = [v for v in map(property_features, properties) if v]
+    
+    print(f"Analyzing {len(valid)} properties...")
+    
+    clf, scaler, score_range = fit_deal_model(valid)
+    score_properties(valid, clf, scaler, score_range)
     
     return valid
 
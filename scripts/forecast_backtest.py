@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Walk-Forward Backtester for the Market Forecaster
+Replays history with rolling origins (fit up to month t, forecast t+1..t+h)
+and reports MAPE and interval coverage per horizon and per segment.
+Fits are cached in .forecast-cache/ - pass --prune-cache to drop entries this
+run has superseded (older data or forecaster code), or delete the directory.
+"""
+
+import json
+import hashlib
+import inspect
+import argparse
+import pandas as pd
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import warnings
+warnings.filterwarnings('ignore')
+
+from market_forecast import load_data, prepare_time_series, forecast_prices, HAS_PROPHET
+
+CACHE_DIR = Path(__file__).parent.parent / '.forecast-cache'
+
+# Part of every cache key. The forecasters' source is hashed in as well, but
+# bump this for changes the hash can't see (new dependencies, library upgrades)
+CACHE_VERSION = 2
+
+# z-score for an 80% interval, matching Prophet's default interval_width
+INTERVAL_Z = 1.2816
+
+def prophet_forecaster(train, horizon):
+    """Prophet fit from market_forecast, trimmed to the forecast months"""
+    forecast, _ = forecast_prices(train, periods=horizon)
+    return forecast[forecast['ds'] > train['ds'].max()]
+
+def monthly_history(train):
+    """
+    Series on a complete monthly index, with NaN for months prepare_time_series
+    dropped, so lags are calendar months rather than row positions.
+    """
+    return train.set_index('ds')['y'].asfreq('MS')
+
+def naive_forecaster(train, horizon):
+    """Last observed median carried forward, widening with the horizon"""
+    last = train['y'].iloc[-1]
+    # Month-over-month steps only, so a gap in the series isn't read as one step
+    step_std = monthly_history(train).diff().dropna().std()
+    if np.isnan(step_std):
+        step_std = 0.0
+
+    ds = pd.date_range(train['ds'].max(), periods=horizon + 1, freq='MS')[1:]
+    spread = INTERVAL_Z * step_std * np.sqrt(np.arange(1, horizon + 1))
+    return pd.DataFrame({
+        'ds': ds,
+        'yhat': last,
+        'yhat_lower': last - spread,
+        'yhat_upper': last + spread
+    })
+
+def seasonal_naive_forecaster(train, horizon):
+    """Same month last year, shifted by the year-over-year drift"""
+    history = monthly_history(train)
+    ds = pd.date_range(train['ds'].max(), periods=horizon + 1, freq='MS')[1:]
+
+    yhat = []
+    for d in ds:
+        # Walk back a year at a time until we hit an observed month
+        back = d - pd.DateOffset(years=1)
+        while pd.isna(history.get(back)) and back >= history.index.min():
+            back -= pd.DateOffset(years=1)
+        value = history.get(back)
+        yhat.append(train['y'].iloc[-1] if pd.isna(value) else value)
+    yhat = np.array(yhat, dtype=float)
+
+    yoy = history.pct_change(12, fill_method=None).dropna()
+    if len(yoy) > 0:
+        yhat *= 1 + yoy.iloc[-1]
+
+    resid_std = history.diff(12).dropna().std()
+    if np.isnan(resid_std):
+        resid_std = history.diff().dropna().std()
+    if np.isnan(resid_std):
+        resid_std = 0.0
+
+    return pd.DataFrame({
+        'ds': ds,
+        'yhat': yhat,
+        'yhat_lower': yhat - INTERVAL_Z * resid_std,
+        'yhat_upper': yhat + INTERVAL_Z * resid_std
+    })
+
+# Every forecaster takes (train, horizon) and returns ds/yhat/yhat_lower/yhat_upper
+FORECASTERS = {
+    'naive': naive_forecaster,
+    'seasonal_naive': seasonal_naive_forecaster,
+}
+if HAS_PROPHET:
+    FORECASTERS['prophet'] = prophet_forecaster
+
+# Code each forecaster's output depends on, hashed into its cache keys
+FORECASTER_DEPS = {
+    'naive': [naive_forecaster, monthly_history],
+    'seasonal_naive': [seasonal_naive_forecaster, monthly_history],
+    'prophet': [prophet_forecaster, forecast_prices],
+}
+
+def forecaster_version(name):
+    """Hash of CACHE_VERSION, INTERVAL_Z and the forecaster's source"""
+    h = hashlib.sha1(f"{CACHE_VERSION}|{INTERVAL_Z}|".encode('utf-8'))
+    for fn in FORECASTER_DEPS[name]:
+        h.update(inspect.getsource(fn).encode('utf-8'))
+    return h.hexdigest()[:12]
+
+def build_segments(properties, min_months):
+    """Monthly series for the whole state plus every city with enough history"""
+    segments = {}
+
+    overall = prepare_time_series(properties)
+    if overall is not None and len(overall) >= min_months:
+        segments['All'] = overall.reset_index(drop=True)
+
+    by_city = {}
+    for p in properties:
+        by_city.setdefault(p.get('city', 'Unknown'), []).append(p)
+
+    for city, props in sorted(by_city.items()):
+        df = prepare_time_series(props)
+        if df is not None and len(df) >= min_months:
+            segments[city] = df.reset_index(drop=True)
+
+    return segments
+
+def cache_key(segment, forecaster, train, horizon, version):
+    """
+    Key a fit on its exact training data and forecaster version, not just the
+    origin month, so a refreshed dataset or changed forecaster invalidates it.
+    """
+    h = hashlib.sha1()
+    h.update(f"{segment}|{forecaster}|{horizon}|{version}|".encode('utf-8'))
+    h.update(train[['ds', 'y']].to_csv(index=False).encode('utf-8'))
+    return h.hexdigest()
+
+def load_cached(key):
+    path = CACHE_DIR / f"{key}.json"
+    if not path.exists():
+        return None
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+        df = pd.DataFrame(entry['forecast'])
+        df['ds'] = pd.to_datetime(df['ds'])
+    except (OSError, ValueError, KeyError, TypeError):
+        # Unreadable entry - treat as a miss and let the refit overwrite it
+        return None
+    return df
+
+def cache_slot(job):
+    """What a cache entry forecasts, independent of the data and code behind it"""
+    return (job['segment'], job['forecaster'], job['horizon'], job['origin'].strftime('%Y-%m-%d'))
+
+def save_cached(job, forecast):
+    CACHE_DIR.mkdir(exist_ok=True)
+    rows = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].copy()
+    rows['ds'] = rows['ds'].dt.strftime('%Y-%m-%d')
+    segment, forecaster, horizon, origin = cache_slot(job)
+    entry = {
+        'segment': segment,
+        'forecaster': forecaster,
+        'horizon': horizon,
+        'origin': origin,
+        'version': job['version'],
+        'forecast': rows.to_dict('records')
+    }
+
+    # Write then rename, so an interrupted run never leaves a truncated entry
+    path = CACHE_DIR / f"{job['key']}.json"
+    tmp_path = path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    tmp_path.replace(path)
+
+def prune_cache(jobs):
+    """
+    Delete entries this run superseded: same segment, forecaster, horizon and
+    origin but a different key, i.e. older training data or forecaster code.
+    Fits for other forecasters, horizons or origins are kept. Unreadable
+    entries and leftover temp files are dropped too.
+    """
+    if not CACHE_DIR.exists():
+        return 0
+    current = {cache_slot(job): job['key'] for job in jobs}
+    removed = 0
+    for path in CACHE_DIR.iterdir():
+        key = path.name.split('.')[0]
+        if path.suffix == '.json':
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+                slot = (entry['segment'], entry['forecaster'], entry['horizon'], entry['origin'])
+            except (OSError, ValueError, KeyError, TypeError):
+                slot = None
+            if slot is not None and current.get(slot, key) == key:
+                continue
+        path.unlink()
+        removed += 1
+    return removed
+
+def run_fit(forecaster, train, horizon):
+    """Worker entry point - must stay at module level to be picklable"""
+    forecast = FORECASTERS[forecaster](train, horizon)
+    return forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].reset_index(drop=True)
+
+def plan_jobs(segments, forecasters, horizon, min_train):
+    """One fit per (segment, forecaster, origin); every horizon reuses it"""
+    jobs = []
+    versions = {name: forecaster_version(name) for name in forecasters}
+    for segment, df in segments.items():
+        # Last origin still needs at least one month of actuals after it
+        for t in range(min_train, len(df)):
+            train = df.iloc[:t][['ds', 'y']].reset_index(drop=True)
+            for name in forecasters:
+                jobs.append({
+                    'segment': segment,
+                    'forecaster': name,
+                    'origin': train['ds'].max(),
+                    'train': train,
+                    'horizon': horizon,
+                    'version': versions[name],
+                    'key': cache_key(segment, name, train, horizon, versions[name])
+                })
+    return jobs
+
+def run_jobs(jobs, horizon, workers, use_cache=True):
+    """Resolve cached fits locally, farm the rest out to a process pool"""
+    results = {}
+    pending = []
+    seen = {}
+
+    for job in jobs:
+        if job['key'] in results or job['key'] in seen:
+            continue
+        cached = load_cached(job['key']) if use_cache else None
+        if cached is not None:
+            results[job['key']] = cached
+        else:
+            seen[job['key']] = job
+            pending.append(job)
+
+    print(f"  {len(results)} fits from cache, {len(pending)} to run")
+    if not pending:
+        return results
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_fit, job['forecaster'], job['train'], horizon): job
+            for job in pending
+        }
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                forecast = future.result()
+            except Exception as e:
+                print(f"  Fit failed ({job['segment']}, {job['forecaster']}, "
+                      f"{job['origin'].strftime('%Y-%m')}): {e}")
+                continue
+
+            results[job['key']] = forecast
+            if use_cache:
+                save_cached(job, forecast)
+
+            done += 1
+            if done % 50 == 0 or done == len(pending):
+                print(f"  Completed {done}/{len(pending)} fits")
+
+    return results
+
+def score(jobs, results, segments, horizon):
+    """Line each forecast up against actuals and tag it with its horizon step"""
+    rows = []
+    for job in jobs:
+        forecast = results.get(job['key'])
+        if forecast is None:
+            continue
+
+        actuals = segments[job['segment']]
+        merged = forecast.merge(actuals[['ds', 'y']], on='ds', how='inner')
+
+        for _, r in merged.iterrows():
+            # Horizon counts calendar months, so gaps in the series don't shift it
+            step = ((r['ds'].year - job['origin'].year) * 12
+                    + r['ds'].month - job['origin'].month)
+            if step < 1 or step > horizon:
+                continue
+            rows.append({
+                'segment': job['segment'],
+                'forecaster': job['forecaster'],
+                'origin': job['origin'],
+                'horizon': step,
+                'ape': abs(r['yhat'] - r['y']) / r['y'] * 100,
+                'covered': int(r['yhat_lower'] <= r['y'] <= r['yhat_upper'])
+            })
+
+    return pd.DataFrame(rows)
+
+def summarize(scored, keys):
+    grouped = scored.groupby(keys).agg(
+        mape=('ape', 'mean'),
+        coverage=('covered', 'mean'),
+        n=('ape', 'count')
+    ).reset_index()
+    grouped['mape'] = grouped['mape'].round(2)
+    grouped['coverage'] = (grouped['coverage'] * 100).round(1)
+    return grouped
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of the market forecaster')
+    parser.add_argument('--horizon', type=int, default=6, help='Months ahead to forecast from each origin')
+    parser.add_argument('--min-train', type=int, default=24, help='Months of history before the first origin')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: CPU count)')
+    parser.add_argument('--forecasters', default=','.join(FORECASTERS),
+                        help='Comma-separated list of: ' + ', '.join(FORECASTERS))
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not write cached fits')
+    parser.add_argument('--prune-cache', action='store_true',
+                    help='Afterwards, delete cached fits this run superseded')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("RI Real Estate Forecast Backtester")
+    print("=" * 50)
+
+    forecasters = [f.strip() for f in args.forecasters.split(',') if f.strip()]
+    unknown = [f for f in forecasters if f not in FORECASTERS]
+    if unknown:
+        print(f"Unknown forecaster(s): {', '.join(unknown)}")
+        return
+    if not HAS_PROPHET:
+        print("Prophet not installed - backtesting baseline forecasters only")
+
+    properties = load_data()
+    print(f"Loaded {len(properties)} properties")
+
+    segments = build_segments(properties, args.min_train + 1)
+    if not segments:
+        print("Not enough time series data!")
+        return
+    print(f"Prepared {len(segments)} segments: {', '.join(segments)}")
+
+    jobs = plan_jobs(segments, forecasters, args.horizon, args.min_train)
+    print(f"\nRunning {len(jobs)} walk-forward fits "
+          f"({len(forecasters)} forecasters, horizon {args.horizon})...")
+    results = run_jobs(jobs, args.horizon, args.workers, use_cache=not args.no_cache)
+
+    if args.prune_cache:
+        removed = prune_cache(jobs)
+        print(f"  Pruned {removed} superseded cache entries")
+
+    scored = score(jobs, results, segments, args.horizon)
+    if scored.empty:
+        print("No forecasts overlapped with actuals!")
+        return
+
+    by_horizon = summarize(scored, ['forecaster', 'horizon'])
+    by_segment = summarize(scored, ['forecaster', 'segment'])
+    overall = summarize(scored, ['forecaster'])
+
+    print(f"\n{'=' * 50}")
+    print("ACCURACY BY HORIZON (All Segments)")
+    print("=" * 50)
+    for name in forecasters:
+        print(f"\n  {name}:")
+        for _, row in by_horizon[by_horizon['forecaster'] == name].iterrows():
+            print(f"    +{row['horizon']}m: MAPE {row['mape']:.1f}% | "
+                  f"coverage {row['coverage']:.0f}% | n={row['n']}")
+
+    print(f"\n{'=' * 50}")
+    print("ACCURACY BY SEGMENT")
+    print("=" * 50)
+    for segment in segments:
+        rows = by_segment[by_segment['segment'] == segment]
+        if rows.empty:
+            continue
+        print(f"\n  {segment}:")
+        for _, row in rows.iterrows():
+            print(f"    {row['forecaster']}: MAPE {row['mape']:.1f}% | "
+                  f"coverage {row['coverage']:.0f}% | n={row['n']}")
+
+    print(f"\n{'=' * 50}")
+    print("OVERALL")
+    print("=" * 50)
+    for _, row in overall.sort_values('mape').iterrows():
+        print(f"  {row['forecaster']}: MAPE {row['mape']:.1f}% | coverage {row['coverage']:.0f}%")
+
+    # Save results
+    output = {
+        'config': {
+            'horizon': args.horizon,
+            'min_train': args.min_train,
+            'forecasters': forecasters,
+            'segments': list(segments)
+        },
+        'by_horizon': by_horizon.to_dict('records'),
+        'by_segment': by_segment.to_dict('records'),
+        'overall': overall.to_dict('records')
+    }
+
+    output_path = Path(__file__).parent.parent / 'ri-forecast-backtest.json'
+    with open(output_path, 'w') as f:
+        json.dump(output, f, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+
+    print(f"\nSaved backtest results to {output_path}")
+
+if __name__ == '__main__':
+    main()
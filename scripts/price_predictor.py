@@ -22,6 +22,25 @@ def load_data():
         data = json.load(f)
     return data['properties']
 
+def property_features(p):
+    """Model features for one property, or None if it can't be priced"""
+    # Skip if missing key features
+    if not all([p.get('sqft'), p.get('beds'), p.get('price')]):
+        return None
+    if p['sqft'] <= 0 or p['price'] <= 50000 or p['price'] > 5000000:
+        return None
+    if p['sqft'] > 10000:  # Filter outliers
+        return None
+    
+    return [
+        p.get('sqft', 0),
+        p.get('beds', 0),
+        p.get('baths', 0) or 0,
+        p.get('yearBuilt', 1970) or 1970,
+        p.get('lotSize', 0) or 0,
+        1 if p.get('soldDate') else 0,  # Is sold
+    ]
+
 def prepare_features(properties):
     """Extract features for ML model"""
     features = []
@@ -29,31 +48,18 @@ def prepare_features(properties):
     indices = []
     
     for i, p in enumerate(properties):
-        # Skip if missing key features
-        if not all([p.get('sqft'), p.get('beds'), p.get('price')]):
-            continue
-        if p['sqft'] <= 0 or p['price'] <= 50000 or p['price'] > 5000000:
-            continue
-        if p['sqft'] > 10000:  # Filter outliers
+        row = property_features(p)
+        if row is None:
             continue
             
-        features.append([
-            p.get('sqft', 0),
-            p.get('beds', 0),
-            p.get('baths', 0) or 0,
-            p.get('yearBuilt', 1970) or 1970,
-            p.get('lotSize', 0) or 0,
-            1 if p.get('soldDate') else 0,  # Is sold
-        ])
+        features.append(row)
         prices.append(p['price'])
         indices.append(i)
     
     return np.array(features), np.array(prices), indices
 
-def train_model(X, y):
-    """Train Gradient Boosting model"""
-    print(f"Training on {len(X)} properties...")
-    
+def fit_model(X, y):
+    """Fit the scaler and Gradient Boosting model without cross-validation"""
     # Scale features
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
@@ -65,16 +71,23 @@ def train_model(X, y):
         learning_rate=0.1,
         random_state=42
     )
+    model.fit(X_scaled, y)
     
-    # Cross-validation score
-    scores = cross_val_score(model, X_scaled, y, cv=5, scoring='r2')
-    print(f"Cross-validation R² scores: {scores}")
-    print(f"Mean R²: {scores.mean():.3f} (+/- {scores.std() * 2:.3f})")
+    return model, scaler
+
+def train_model(X, y):
+    """Train Gradient Boosting model"""
+    print(f"Training on {len(X)} properties...")
     
     # Fit final model
-    model.fit(X_scaled, y)
+    model, scaler = fit_model(X, y)
     
-    return model, scaler
+    # Cross-validation score (cross_val_score refits clones, not the final model)
+    scores = cross_val_score(model, scaler.transform(X), y, cv=5, scoring='r2')
+    print(f"Cross-validation R² scores: {scores}")
+    print(f"Mean R²: {scores.mean():.3f} (+/- {scores.std() * 2:.3f})")
+    
+    return model, scaler, scores
 
 def predict_prices(model, scaler, X):
     """Generate predictions"""
@@ -96,7 +109,7 @@ def main():
     print(f"Prepared {len(X)} properties with valid features")
     
     # Train model
-    model, scaler = train_model(X, y)
+    model, scaler, scores = train_model(X, y)
     
     # Generate predictions
     predictions = predict_prices(model, scaler, X)
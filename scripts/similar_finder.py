@@ -81,35 +81,35 @@ def find_similar(knn, scaler, sold, target_features, k=5):
     
     return similar
 
+def analyze_listing(v, knn, scaler, sold):
+    """Find comps for one listing and attach its comp-based valuation"""
+    p = v['property']
+    similar = find_similar(knn, scaler, sold, v['features'], k=5)
+    
+    # Calculate estimated value from comps
+    comp_prices = [s['price'] for s in similar]
+    comp_ppsf = [s['price'] / s['sqft'] for s in similar]
+    
+    estimated_value = int(np.mean(comp_prices))
+    estimated_ppsf = int(np.mean(comp_ppsf))
+    suggested_price = int(estimated_ppsf * p['sqft'])
+    
+    p['similarComps'] = similar
+    p['estimatedValue'] = estimated_value
+    p['suggestedPrice'] = suggested_price
+    p['compAvgPpsf'] = estimated_ppsf
+    p['priceDiff'] = p['price'] - suggested_price
+    p['priceDiffPct'] = round((p['price'] - suggested_price) / suggested_price * 100, 1)
+    
+    return p
+
 def analyze_active_listings(valid, knn, scaler, sold):
     """For each active listing, find similar comps and estimate value"""
     active = [v for v in valid if not v['is_sold']]
     
     print(f"Analyzing {len(active)} active listings...")
     
-    results = []
-    for v in active:
-        p = v['property']
-        similar = find_similar(knn, scaler, sold, v['features'], k=5)
-        
-        # Calculate estimated value from comps
-        comp_prices = [s['price'] for s in similar]
-        comp_ppsf = [s['price'] / s['sqft'] for s in similar]
-        
-        estimated_value = int(np.mean(comp_prices))
-        estimated_ppsf = int(np.mean(comp_ppsf))
-        suggested_price = int(estimated_ppsf * p['sqft'])
-        
-        p['similarComps'] = similar
-        p['estimatedValue'] = estimated_value
-        p['suggestedPrice'] = suggested_price
-        p['compAvgPpsf'] = estimated_ppsf
-        p['priceDiff'] = p['price'] - suggested_price
-        p['priceDiffPct'] = round((p['price'] - suggested_price) / suggested_price * 100, 1)
-        
-        results.append(p)
-    
-    return results
+    return [analyze_listing(v, knn, scaler, sold) for v in active]
 
 def main():
     print("=" * 50)
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Pipeline Watcher
+Watches the source datasets and reruns only the analyses a change affects.
+Edited or new active listings are rescored in place; sales changes queue a retrain.
+"""
+
+import json
+import gzip
+import sys
+import time
+import argparse
+import threading
+import subprocess
+import numpy as np
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import warnings
+warnings.filterwarnings('ignore')
+
+import deal_scorer
+import price_predictor
+import similar_finder
+
+ROOT = Path(__file__).parent.parent
+SCRIPTS = Path(__file__).parent
+
+SALES_PATH = ROOT / 'ri-sales.json.gz'
+ASSESSMENTS_PATH = ROOT / 'ri-assessments-geocoded.json.gz'
+
+# Output file owned by each analysis script
+OUTPUTS = {
+    'deal_scorer': ROOT / 'ri-sales-scored.json',
+    'price_predictor': ROOT / 'ri-sales-predicted.json',
+    'similar_finder': ROOT / 'ri-sales-comps.json',
+    'market_forecast': ROOT / 'ri-market-forecast.json',
+}
+
+# Fields the models read - anything else (dom, url, status...) only needs copying
+SCORED_FIELDS = {'price', 'sqft', 'beds', 'baths', 'yearBuilt', 'lotSize', 'soldDate'}
+FORECAST_FIELDS = {'price', 'soldDate', 'city'}
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+def record_key(p):
+    """MLS number when we have one, otherwise address + city + sale date"""
+    if p.get('mls'):
+        return f"mls:{p['mls']}"
+    address = (p.get('address') or '').strip().upper()
+    city = (p.get('city') or '').strip().upper()
+    return f"addr:{address}|{city}|{p.get('saleDate') or p.get('soldDate') or ''}"
+
+def load_records(path):
+    """
+    Load a dataset as {record_key: [rows]}. Keys aren't unique - the same
+    address can appear twice without an MLS number - so no row is dropped.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    rows = data['properties'] if isinstance(data, dict) else data
+    records = {}
+    for p in rows:
+        records.setdefault(record_key(p), []).append(p)
+    return records
+
+def all_rows(records):
+    return [p for rows in records.values() for p in rows]
+
+def file_signature(path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def diff_records(old, new):
+    """
+    Added and removed (key, row) pairs, plus {key: differing fields} for keys
+    holding a single row on both sides. Keys shared by several rows are
+    compared as multisets, so an edit there shows up as a removal and an add.
+    """
+    added = []
+    removed = []
+    changed = {}
+    for k in new.keys() | old.keys():
+        before, after = old.get(k, []), new.get(k, [])
+        if before == after:
+            continue
+        if len(before) == 1 and len(after) == 1:
+            b, a = before[0], after[0]
+            changed[k] = {f for f in b.keys() | a.keys() if b.get(f) != a.get(f)}
+            continue
+        unmatched = list(before)
+        for p in after:
+            if p in unmatched:
+                unmatched.remove(p)
+            else:
+                added.append((k, p))
+        removed.extend((k, p) for p in unmatched)
+    return added, removed, changed
+
+def is_sold(p):
+    return bool(p and p.get('soldDate'))
+
+def is_modeled(p):
+    """Whether the feature models (scorer/predictor/comps) look at this row"""
+    return bool(p) and price_predictor.property_features(p) is not None
+
+def plan_sales_changes(old, new, added, removed, changed):
+    """
+    Decide which work a sales diff needs.
+    Returns (scripts to retrain, {key: needs_rescore} for patches).
+    Any sold row entering, leaving or changing moves the training data, so
+    those retrain; active listings only need their own rows redone.
+    """
+    retrain = set()
+    patches = {}
+
+    for k, p in added + removed:
+        if is_sold(p):
+            retrain.add('market_forecast')
+            if is_modeled(p):
+                retrain.update(['deal_scorer', 'price_predictor', 'similar_finder'])
+        elif is_modeled(p):
+            patches[k] = True
+
+    for k, fields in changed.items():
+        before, after = old[k][0], new[k][0]
+        if is_sold(before) or is_sold(after):
+            if fields & FORECAST_FIELDS:
+                retrain.add('market_forecast')
+            if (is_modeled(before) or is_modeled(after)) and fields & SCORED_FIELDS:
+                retrain.update(['deal_scorer', 'price_predictor', 'similar_finder'])
+            elif is_modeled(before) or is_modeled(after):
+                # e.g. a new photo URL on a sold comp - nothing to recompute
+                patches.setdefault(k, False)
+        elif is_modeled(before) or is_modeled(after):
+            patches[k] = patches.get(k, False) or bool(fields & SCORED_FIELDS)
+
+    return retrain, patches
+
+class ModelCache:
+    """
+    In-memory models for patching single rows, fit lazily on the snapshot
+    from the last retrain so unchanged data is never refit.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset([])
+
+    def reset(self, properties):
+        with self.lock:
+            self.properties = list(properties)
+            self.models = {}
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.models:
+                log(f"Fitting {name} model for incremental updates...")
+                self.models[name] = self._fit(name)
+            return self.models[name]
+
+    def _fit(self, name):
+        if name == 'deal_scorer':
+            valid = [v for v in map(deal_scorer.property_features, self.properties) if v]
+            return deal_scorer.fit_deal_model(valid) if valid else None
+        if name == 'price_predictor':
+            X, y, _ = price_predictor.prepare_features(self.properties)
+            return price_predictor.fit_model(X, y) if len(X) else None
+        if name == 'similar_finder':
+            knn, scaler, sold = similar_finder.build_knn_model(similar_finder.prepare_data(self.properties))
+            return (knn, scaler, sold) if knn else None
+        raise ValueError(f"No incremental model for {name}")
+
+def rescore_deal(p, model):
+    v = deal_scorer.property_features(p)
+    if v is None:
+        return None
+    clf, scaler, score_range = model
+    deal_scorer.score_properties([v], clf, scaler, score_range)
+    return v['property']
+
+def rescore_price(p, model):
+    features = price_predictor.property_features(p)
+    if features is None:
+        return None
+    model, scaler = model
+    pred = price_predictor.predict_prices(model, scaler, np.array([features]))[0]
+    p['predictedPrice'] = int(pred)
+    p['priceError'] = int(pred - p['price'])
+    p['priceErrorPct'] = round((pred - p['price']) / p['price'] * 100, 1)
+    return p
+
+def rescore_comps(p, model):
+    if is_sold(p):
+        return None
+    valid = similar_finder.prepare_data([p])
+    if not valid:
+        return None
+    knn, scaler, sold = model
+    return similar_finder.analyze_listing(valid[0], knn, scaler, sold)
+
+def summarize_scored(data):
+    props = data['properties']
+    cities = deal_scorer.analyze_by_city(
+        [{'property': p, 'ppsf': p['price'] / p['sqft']} for p in props]
+    )
+    data['summary'] = {
+        'total': len(props),
+        'deals_found': sum(1 for p in props if p['isAnomaly']),
+        'cities': cities
+    }
+
+def summarize_comps(data):
+    props = data['properties']
+    data['summary'] = {
+        'analyzed': len(props),
+        'deals': sum(1 for p in props if p['priceDiffPct'] < -10),
+        'overpriced': sum(1 for p in props if p['priceDiffPct'] > 20)
+    }
+
+# How to redo one row of each patchable output, refresh its summary,
+# which fields the script computes (never overwritten by a copy-only update -
+# the source rows carry their own, differently rounded, pricePerSqft), and
+# which field holds embedded copies of other source rows that also need refreshing
+PATCHERS = {
+    'deal_scorer': {
+        'rescore': rescore_deal,
+        'summarize': summarize_scored,
+        'computed': {'dealScore', 'isAnomaly', 'pricePerSqft'},
+        'embedded': None,
+    },
+    'price_predictor': {
+        'rescore': rescore_price,
+        'summarize': None,
+        'computed': {'predictedPrice', 'priceError', 'priceErrorPct'},
+        'embedded': None,
+    },
+    'similar_finder': {
+        'rescore': rescore_comps,
+        'summarize': summarize_comps,
+        'computed': {'similarComps', 'estimatedValue', 'suggestedPrice',
+                     'compAvgPpsf', 'priceDiff', 'priceDiffPct'},
+        'embedded': 'similarComps',
+    },
+}
+
+class Scheduler:
+    """Bounded worker pool that coalesces retrains and serializes work per output"""
+
+    def __init__(self, workers, models):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.models = models
+        self.output_locks = {name: threading.Lock() for name in OUTPUTS}
+        self.queued = set()
+        self.queued_lock = threading.Lock()
+
+    def retrain(self, name):
+        with self.queued_lock:
+            if name in self.queued:
+                log(f"  {name}: retrain already queued")
+                return
+            self.queued.add(name)
+        log(f"  {name}: retrain queued")
+        self.pool.submit(self._run_script, name)
+
+    def patch(self, name, rows):
+        with self.queued_lock:
+            if name in self.queued:
+                # The queued retrain hasn't started, so it will read these rows anyway
+                log(f"  {name}: patch folded into queued retrain")
+                return
+        if not OUTPUTS[name].exists():
+            self.retrain(name)
+            return
+        log(f"  {name}: patching {len(rows)} rows")
+        self.pool.submit(self._apply_patch, name, rows)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def _run_script(self, name):
+        with self.output_locks[name]:
+            with self.queued_lock:
+                self.queued.discard(name)
+            started = time.time()
+            result = subprocess.run(
+                [sys.executable, str(SCRIPTS / f"{name}.py")],
+                cwd=ROOT, capture_output=True, text=True
+            )
+            elapsed = time.time() - started
+            if result.returncode == 0:
+                log(f"  {name}: retrained in {elapsed:.0f}s")
+            else:
+                tail = (result.stderr or result.stdout).strip().splitlines()[-1:]
+                log(f"  {name}: retrain failed ({' '.join(tail)})")
+
+    def _apply_patch(self, name, rows):
+        """rows: {key: (current source rows for the key, needs_rescore, changed fields)}"""
+        patcher = PATCHERS[name]
+        try:
+            with self.output_locks[name]:
+                path = OUTPUTS[name]
+                with open(path) as f:
+                    data = json.load(f)
+
+                positions = {}
+                for i, p in enumerate(data['properties']):
+                    positions.setdefault(record_key(p), []).append(i)
+
+                model = None
+                embedded = None
+                replaced = {}
+                for key, (sources, needs_rescore, fields) in rows.items():
+                    if not needs_rescore:
+                        targets = [data['properties'][i] for i in positions.get(key, [])]
+                        if patcher['embedded']:
+                            # e.g. a sold row's url changing inside every listing's comps
+                            if embedded is None:
+                                embedded = {}
+                                for p in data['properties']:
+                                    for copy in p.get(patcher['embedded']) or []:
+                                        embedded.setdefault(record_key(copy), []).append(copy)
+                            targets += embedded.get(key, [])
+                        # Only planned for keys with a single row, so this is a 1:1 copy
+                        for target in targets:
+                            for p in sources:
+                                target.update({f: v for f, v in p.items() if f not in patcher['computed']})
+                                # update() can't express a field deleted from the source row
+                                for f in fields - patcher['computed'] - p.keys():
+                                    target.pop(f, None)
+                        continue
+                    if model is None:
+                        model = self.models.get(name)
+                        if model is None:
+                            # Copy-only updates made above would be lost too, so redo it all
+                            log(f"  {name}: no model to patch with, falling back to retrain")
+                            self.retrain(name)
+                            return
+                    rescored = (patcher['rescore'](dict(p), model) for p in sources)
+                    replaced[key] = [p for p in rescored if p is not None]
+
+                # Every output row under a rescored key is rebuilt from its source
+                # rows; rows under any other key are left exactly as they were
+                props = []
+                for i, p in enumerate(data['properties']):
+                    key = record_key(p)
+                    if key not in replaced:
+                        props.append(p)
+                    else:
+                        # Reuse the key's original slots in order; extras go in the last one
+                        slots, new_rows = positions[key], replaced[key]
+                        n = slots.index(i)
+                        if n < len(slots) - 1:
+                            props.extend(new_rows[n:n + 1])
+                        else:
+                            props.extend(new_rows[n:])
+                for key, new_rows in replaced.items():
+                    if key not in positions:
+                        props.extend(new_rows)
+                data['properties'] = props
+
+                if patcher['summarize']:
+                    patcher['summarize'](data)
+
+                tmp_path = path.with_suffix('.json.tmp')
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                tmp_path.replace(path)
+            log(f"  {name}: patched {len(rows)} rows")
+        except Exception as e:
+            log(f"  {name}: patch failed ({e}), falling back to retrain")
+            self.retrain(name)
+
+class Watcher:
+    def __init__(self, scheduler, models):
+        self.scheduler = scheduler
+        self.models = models
+        self.sales = load_records(SALES_PATH)
+        self.assessments = load_records(ASSESSMENTS_PATH) if ASSESSMENTS_PATH.exists() else {}
+        self.seen = {path: file_signature(path) for path in (SALES_PATH, ASSESSMENTS_PATH)}
+        self.models.reset(all_rows(self.sales))
+
+    def run_all(self):
+        log("Running full pipeline...")
+        for name in OUTPUTS:
+            self.scheduler.retrain(name)
+
+    def watch(self, interval, debounce):
+        """Poll file signatures; act once a changed file has been quiet for `debounce` seconds"""
+        last = dict(self.seen)
+        changed_at = None
+        while True:
+            time.sleep(interval)
+            current = {path: file_signature(path) for path in last}
+            if current != last:
+                last = current
+                changed_at = time.time()
+                continue
+            if changed_at is None or time.time() - changed_at < debounce:
+                continue
+
+            changed_at = None
+            for path, sig in current.items():
+                if sig is None or sig == self.seen[path]:
+                    continue
+                try:
+                    if path == SALES_PATH:
+                        self.on_sales_change()
+                    else:
+                        self.on_assessments_change()
+                    self.seen[path] = sig
+                except Exception as e:
+                    # Most likely a writer still going, or a file of the wrong shape;
+                    # either way keep the daemon up and try again on the next quiet period
+                    log(f"Could not process {path.name} ({type(e).__name__}: {e}), will retry")
+                    changed_at = time.time()
+
+    def on_sales_change(self):
+        new = load_records(SALES_PATH)
+        old = self.sales
+        added, removed, changed = diff_records(old, new)
+        log(f"{SALES_PATH.name}: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+
+        retrain, patches = plan_sales_changes(old, new, added, removed, changed)
+        self.sales = new
+
+        if retrain & PATCHERS.keys():
+            # Patch models are rebuilt from this snapshot the next time they're needed;
+            # a forecast-only retrain leaves their inputs untouched, so keep them
+            self.models.reset(all_rows(new))
+        for name in sorted(retrain):
+            self.scheduler.retrain(name)
+
+        if patches:
+            rows = {
+                k: (new.get(k, []), needs_rescore, changed.get(k, set()))
+                for k, needs_rescore in patches.items()
+            }
+            for name in PATCHERS:
+                if name not in retrain:
+                    self.scheduler.patch(name, rows)
+
+        if not retrain and not patches:
+            log("  Nothing the analyses read has changed")
+
+    def on_assessments_change(self):
+        new = load_records(ASSESSMENTS_PATH)
+        added, removed, changed = diff_records(self.assessments, new)
+        self.assessments = new
+        # None of the scripts read the assessments yet, so there's nothing to queue
+        log(f"{ASSESSMENTS_PATH.name}: {len(added)} added, {len(removed)} removed, "
+            f"{len(changed)} changed (no dependent analyses)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch source datasets and rerun affected analyses')
+    parser.add_argument('--interval', type=float, default=2.0, help='Seconds between file checks')
+    parser.add_argument('--debounce', type=float, default=10.0, help='Seconds a file must be quiet before acting')
+    parser.add_argument('--workers', type=int, default=2, help='Max analyses running at once')
+    parser.add_argument('--run-now', action='store_true', help='Run every analysis once at startup')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("RI Real Estate Pipeline Watcher")
+    print("=" * 50)
+
+    models = ModelCache()
+    scheduler = Scheduler(args.workers, models)
+    watcher = Watcher(scheduler, models)
+    log(f"Loaded {len(all_rows(watcher.sales))} sales, {len(all_rows(watcher.assessments))} assessments")
+
+    if args.run_now:
+        watcher.run_all()
+
+    log(f"Watching {SALES_PATH.name} and {ASSESSMENTS_PATH.name} (Ctrl+C to stop)")
+    try:
+        watcher.watch(args.interval, args.debounce)
+    except KeyboardInterrupt:
+        log("Stopping, waiting for running jobs...")
+        scheduler.shutdown()
+
+if __name__ == '__main__':
+    main()